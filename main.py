@@ -28,18 +28,131 @@ def print_help():
     print("\nOr just type a question to ask about the loaded PDFs.\n")
 
 
+class CLISession:
+    """State shared by the CLI command handlers."""
+
+    def __init__(self, rag: SimpleRAG):
+        self.rag = rag
+        self.current_user_id = None
+        self.running = True
+
+
+def handle_exit(session: CLISession, arg: str) -> None:
+    """Stop the CLI loop."""
+    print("Goodbye!")
+    session.running = False
+
+
+def handle_help(session: CLISession, arg: str) -> None:
+    """Show the help message."""
+    print_help()
+
+
+def handle_load(session: CLISession, pdf_path: str) -> None:
+    """Load a PDF file."""
+    if os.path.exists(pdf_path):
+        print("⏳ Loading PDF...")
+        text_length = len(session.rag.load_pdf(pdf_path))
+        print(f"✓ PDF loaded ({text_length} characters)")
+    else:
+        print(f"❌ File not found: {pdf_path}")
+
+
+def handle_list_docs(session: CLISession, arg: str) -> None:
+    """List loaded PDFs."""
+    docs = session.rag.list_documents()
+    if docs:
+        print("\n📚 Loaded Documents:")
+        for i, doc in enumerate(docs, 1):
+            print(f"  {i}. {doc['name']} ({doc['pages']} pages, {doc['char_count']} chars)")
+    else:
+        print("ℹ️ No documents loaded. Use 'load <path>' to add PDFs.")
+
+
+def handle_remove_doc(session: CLISession, doc_name: str) -> None:
+    """Remove a specific PDF."""
+    if session.rag.remove_document(doc_name):
+        print(f"✓ Removed: {doc_name}")
+
+
+def handle_clear(session: CLISession, arg: str) -> None:
+    """Clear all loaded documents."""
+    session.rag.clear_documents()
+    print("✓ All documents cleared")
+
+
+def handle_list_users(session: CLISession, arg: str) -> None:
+    """List all users."""
+    users = session.rag.list_users()
+    if users:
+        print("\n👤 Available Users:")
+        for user in users:
+            print(f"  • {user['name']} ({user['user_id']})")
+            if user["preferences"]:
+                print(f"    Preferences: {', '.join(user['preferences'])}")
+    else:
+        print("ℹ️ No users found. Run 'create_user' to add users.")
+
+
+def handle_create_user(session: CLISession, arg: str) -> None:
+    """Create a new user interactively and switch to it."""
+    user_id = input("  User ID: ").strip()
+    if not user_id:
+        print("❌ User ID is required")
+        return
+
+    user_name = input("  User Name: ").strip()
+    if not user_name:
+        print("❌ User Name is required")
+        return
+
+    prefs_input = input("  Preferences (comma-separated): ").strip()
+    prefs = [p.strip() for p in prefs_input.split(",") if p.strip()]
+
+    history_input = input("  Purchase/Interaction History (comma-separated): ").strip()
+    history = [h.strip() for h in history_input.split(",") if h.strip()]
+
+    session.rag.create_user(user_id, user_name, prefs, history)
+    print(f"✓ User '{user_id}' created and saved to users.jsonl")
+    session.current_user_id = user_id
+    print(f"✓ Switched to user '{user_id}'")
+
+
+def handle_select_user(session: CLISession, user_id: str) -> None:
+    """Select a user for chat."""
+    user = session.rag.get_user(user_id)
+    if user:
+        session.current_user_id = user_id
+        print(f"✓ Switched to user: {user['name']} ({user['user_id']})")
+    else:
+        print(f"❌ User not found: {user_id}")
+
+
+# Command name -> (handler, takes an argument)
+HANDLERS = {
+    "exit": (handle_exit, False),
+    "help": (handle_help, False),
+    "load": (handle_load, True),
+    "list_docs": (handle_list_docs, False),
+    "remove_doc": (handle_remove_doc, True),
+    "clear": (handle_clear, False),
+    "list_users": (handle_list_users, False),
+    "create_user": (handle_create_user, False),
+    "select_user": (handle_select_user, True),
+}
+
+
 def main():
     """Main CLI demo."""
     # Use the previous requested model explicitly across the app.
-    rag = SimpleRAG(model="openai/gpt-oss-20b", users_file="users.json")
-    current_user_id = None
+    session = CLISession(SimpleRAG(model="openai/gpt-oss-20b", users_file="users.jsonl"))
 
     print_help()
 
-    while True:
+    while session.running:
         # Build prompt with current user info
-        if current_user_id:
-            prompt_str = f"\n[user ({current_user_id})]> "
+        if session.current_user_id:
+            prompt_str = f"\n[user ({session.current_user_id})]> "
         else:
             prompt_str = "\n> "
 
@@ -48,97 +161,23 @@ def main():
         if not user_input:
             continue
 
-        if user_input.lower() == "exit":
-            print("Goodbye!")
-            break
-
-        if user_input.lower() == "help":
-            print_help()
-            continue
-
-        if user_input.lower().startswith("load "):
-            pdf_path = user_input[5:].strip()
-            if os.path.exists(pdf_path):
-                print("⏳ Loading PDF...")
-                text_length = len(rag.load_pdf(pdf_path))
-                print(f"✓ PDF loaded ({text_length} characters)")
-            else:
-                print(f"❌ File not found: {pdf_path}")
-            continue
-
-        if user_input.lower() == "list_docs":
-            docs = rag.list_documents()
-            if docs:
-                print("\n📚 Loaded Documents:")
-                for i, doc in enumerate(docs, 1):
-                    print(f"  {i}. {doc['name']} ({doc['pages']} pages, {doc['char_count']} chars)")
-            else:
-                print("ℹ️ No documents loaded. Use 'load <path>' to add PDFs.")
-            continue
-
-        if user_input.lower().startswith("remove_doc "):
-            doc_name = user_input[11:].strip()
-            if rag.remove_document(doc_name):
-                print(f"✓ Removed: {doc_name}")
-            continue
-
-        if user_input.lower() == "clear":
-            rag.clear_documents()
-            print("✓ All documents cleared")
-            continue
-
-        if user_input.lower() == "list_users":
-            users = rag.list_users()
-            if users:
-                print("\n👤 Available Users:")
-                for user in users:
-                    print(f"  • {user['name']} ({user['user_id']})")
-                    if user["preferences"]:
-                        print(f"    Preferences: {', '.join(user['preferences'])}")
-            else:
-                print("ℹ️ No users found. Run 'create_user' to add users.")
-            continue
-
-        if user_input.lower() == "create_user":
-            user_id = input("  User ID: ").strip()
-            if not user_id:
-                print("❌ User ID is required")
+        # Lowercase once and split off the command word; arguments keep their case
+        cmd, sep, _ = user_input.lower().partition(" ")
+        command = HANDLERS.get(cmd)
+        if command is not None:
+            handler, takes_arg = command
+            # Commands with arguments need one; bare commands must match exactly
+            if takes_arg == bool(sep):
+                handler(session, user_input[len(cmd) + 1:].strip())
                 continue
 
-            user_name = input("  User Name: ").strip()
-            if not user_name:
-                print("❌ User Name is required")
-                continue
-
-            prefs_input = input("  Preferences (comma-separated): ").strip()
-            prefs = [p.strip() for p in prefs_input.split(",") if p.strip()]
-
-            history_input = input("  Purchase/Interaction History (comma-separated): ").strip()
-            history = [h.strip() for h in history_input.split(",") if h.strip()]
-
-            rag.create_user(user_id, user_name, prefs, history)
-            print(f"✓ User '{user_id}' created and saved to users.json")
-            current_user_id = user_id
-            print(f"✓ Switched to user '{user_id}'")
-            continue
-
-        if user_input.lower().startswith("select_user "):
-            user_id = user_input[12:].strip()
-            user = rag.get_user(user_id)
-            if user:
-                current_user_id = user_id
-                print(f"✓ Switched to user: {user['name']} ({user['user_id']})")
-            else:
-                print(f"❌ User not found: {user_id}")
-            continue
-
         # Otherwise treat as a question
-        if not current_user_id:
+        if not session.current_user_id:
             print("⚠️ No user selected. Use 'select_user <user_id>' or 'create_user' first.")
             continue
 
         print("\n⏳ Generating personalized response...\n")
-        response = rag.generate_response(user_input, user_id=current_user_id)
+        response = session.rag.generate_response(user_input, user_id=session.current_user_id)
         print(f"Response:\n{response}\n")
 
 
@@ -3,9 +3,18 @@ Simple RAG module with user context and personalization.
 Demo purpose: upload PDF, store user profiles, generate personalized responses using Groq.
 """
 
+import io
 import os
 import json
-from typing import List, Optional, Dict
+import time
+import shutil
+import atexit
+import hashlib
+import tempfile
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Dict, Union
 import PyPDF2
 
 # Try importing Groq client, but don't fail import if package or credentials are missing
@@ -15,18 +24,152 @@ except Exception:
     Groq = None
     GroqError = Exception
 
+# httpx ships with groq; used to share one keep-alive connection pool
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+# orjson serializes the users log much faster than the stdlib; optional
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# Retrieval dependencies are optional; without them the full document text is sent.
+# sentence-transformers (and torch) is imported lazily by SimpleRAG._get_embedder.
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# pypdfium2 (C-backed PDFium bindings) is much faster than PyPDF2; optional
+try:
+    import pypdfium2 as pdfium
+except Exception:
+    pdfium = None
+
+# PDFium forbids concurrent calls even on different documents, so every
+# pypdfium2 call in the process goes through this lock
+_PDFIUM_LOCK = threading.Lock()
+
+# Batch user edits into at most one users.jsonl append per debounce interval
+USERS_SAVE_DEBOUNCE_SECONDS = 0.5
+
+# Rewrite the append-only users log as a snapshot once it holds this many
+# lines per live user
+USERS_COMPACT_FACTOR = 10
+
+# Rotating copies of users.jsonl taken before each compaction
+USERS_BACKUP_DIR = ".users_backups"
+USERS_MAX_BACKUPS = 5
+
+# On-disk cache of extracted per-page PDF text, keyed by SHA-256 of the PDF bytes
+PDF_CACHE_DIR = os.path.join(".cache", "pdf_text")
+PDF_CACHE_MAX_ENTRIES = 64
+# Bump when the cached entry format or page text layout changes
+PDF_CACHE_VERSION = 3
+
+# Per-page text extraction runs on a thread pool; very large PDFs are fed
+# to the pool in fixed-size batches to bound the number of queued pages
+PDF_MAX_WORKERS = min(8, os.cpu_count() or 1)
+PDF_STREAMING_PAGE_THRESHOLD = 500
+PDF_PAGE_BATCH_SIZE = 64
+
+# Retrieval settings: fixed-size overlapping chunks, top-k by cosine similarity
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+RETRIEVAL_TOP_K = 8
+
+# Rolling window of user/assistant turns replayed to the model
+MAX_HISTORY_TURNS = 20
+
+SYSTEM_PROMPT = (
+    "You are a helpful, personalized assistant. "
+    "Answer questions based on the provided document context and user context. "
+    "Tailor your response to the user's preferences and history when relevant. "
+    "If the answer is not in the document, say 'The information is not available in the provided document.'"
+)
+
+# Process-wide Groq client, created lazily by _get_groq_client()
+_CLIENT_SINGLETON = None
+_CLIENT_INITIALIZED = False
+_CLIENT_LOCK = threading.Lock()
+
+
+def _get_groq_client():
+    """Create the shared Groq client on first call and return it (None if not configured)."""
+    global _CLIENT_SINGLETON, _CLIENT_INITIALIZED
+    with _CLIENT_LOCK:
+        if _CLIENT_INITIALIZED:
+            return _CLIENT_SINGLETON
+        _CLIENT_INITIALIZED = True
+
+        api_key = os.getenv("GROQ_API_KEY")
+        if Groq is None:
+            print("Warning: 'groq' package not installed. Install it to enable Groq generation.")
+        elif not api_key:
+            print("Warning: GROQ_API_KEY environment variable not set. Set it to enable generation.")
+        else:
+            try:
+                http_client = None
+                if httpx is not None:
+                    limits = httpx.Limits(max_keepalive_connections=8)
+                    try:
+                        http_client = httpx.Client(http2=True, limits=limits)
+                    except ImportError:
+                        # HTTP/2 needs the optional 'h2' package; keep-alive works on HTTP/1.1 too
+                        http_client = httpx.Client(limits=limits)
+                _CLIENT_SINGLETON = Groq(api_key=api_key, http_client=http_client)
+            except Exception as e:
+                print(f"Error initializing Groq client: {e}")
+                _CLIENT_SINGLETON = None
+        return _CLIENT_SINGLETON
+
+
+@lru_cache(maxsize=256)
+def _format_profile(name: str, preferences: tuple, recent_history: tuple) -> str:
+    """Format the "User Context" prompt block for a profile (memoized on its fields)."""
+    lines = [f"Name: {name}"]
+
+    if preferences:
+        lines.append(f"Preferences: {', '.join(preferences)}")
+
+    if recent_history:
+        lines.append(f"Recent interactions: {', '.join(recent_history)}")
+
+    return "\n".join(lines)
+
 
 class UserContextDB:
-    """Simple in-memory vector DB for user profiles and preferences with JSON persistence."""
+    """Simple in-memory vector DB for user profiles and preferences with JSONL persistence.
 
-    def __init__(self, users_file: str = "users.json"):
+    Edits are appended to the users file as one JSON op per line
+    ({"op": "upsert", "user": {...}} or {"op": "delete", "id": ...}) and
+    replayed on load. The log is compacted into a snapshot of upserts when
+    it grows past USERS_COMPACT_FACTOR lines per user.
+    """
+
+    def __init__(self, users_file: str = "users.jsonl"):
         """Initialize the user context database."""
         self.users: Dict[str, dict] = {}  # user_id -> user_profile dict
         self.users_file = users_file
-        
+        self._pending_ops: List[dict] = []
+        self._needs_compaction = False
+        self._log_lines = 0
+        self._last_write = 0.0
+        self._save_timer: Optional[threading.Timer] = None
+        # Reentrant: mutators hold it while recording ops, and the flush timer
+        # holds it while serializing self.users
+        self._save_lock = threading.RLock()
+
         # Auto-load users from file if it exists
         self.load_from_file()
 
+        # Make sure debounced edits reach disk before the process exits
+        atexit.register(self._flush_now)
+
     def create_or_update_user(
         self,
         user_id: str,
@@ -46,24 +189,25 @@ class UserContextDB:
         Returns:
             Updated user profile
         """
-        if user_id not in self.users:
-            self.users[user_id] = {
-                "user_id": user_id,
-                "name": name or f"User_{user_id}",
-                "preferences": preferences or [],
-                "purchase_history": purchase_history or [],
-            }
-        else:
-            if name:
-                self.users[user_id]["name"] = name
-            if preferences:
-                self.users[user_id]["preferences"] = preferences
-            if purchase_history:
-                self.users[user_id]["purchase_history"] = purchase_history
+        with self._save_lock:
+            if user_id not in self.users:
+                self.users[user_id] = {
+                    "user_id": user_id,
+                    "name": name or f"User_{user_id}",
+                    "preferences": preferences or [],
+                    "purchase_history": purchase_history or [],
+                }
+            else:
+                if name:
+                    self.users[user_id]["name"] = name
+                if preferences:
+                    self.users[user_id]["preferences"] = preferences
+                if purchase_history:
+                    self.users[user_id]["purchase_history"] = purchase_history
 
-        # Auto-save to file after any change
-        self.save_to_file()
-        return self.users[user_id]
+            # Auto-save to file after any change
+            self._record({"op": "upsert", "user": self.users[user_id]})
+            return self.users[user_id]
 
     def get_user(self, user_id: str) -> Optional[dict]:
         """
@@ -83,65 +227,206 @@ class UserContextDB:
 
     def delete_user(self, user_id: str) -> bool:
         """Delete a user profile and save to file."""
-        if user_id in self.users:
-            del self.users[user_id]
-            self.save_to_file()
-            return True
+        with self._save_lock:
+            if user_id in self.users:
+                del self.users[user_id]
+                self._record({"op": "delete", "id": user_id})
+                return True
         return False
 
     def save_to_file(self) -> None:
-        """Persist users to JSON file."""
+        """Schedule a debounced rewrite of the users log as a compact snapshot."""
+        with self._save_lock:
+            self._needs_compaction = True
+            self._schedule_flush()
+
+    def _record(self, op: dict) -> None:
+        """Queue an op for the next debounced append to the users log."""
+        with self._save_lock:
+            self._pending_ops.append(op)
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        """Start the debounce timer if none is pending (caller holds _save_lock)."""
+        if self._save_timer is None:
+            elapsed = time.monotonic() - self._last_write
+            delay = max(0.0, USERS_SAVE_DEBOUNCE_SECONDS - elapsed)
+            self._save_timer = threading.Timer(delay, self._flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush(self) -> None:
+        """Append pending ops to the users log, or compact it when it has grown too long."""
+        with self._save_lock:
+            self._save_timer = None
+            if not self._pending_ops and not self._needs_compaction:
+                return
+            self._last_write = time.monotonic()
+            try:
+                if self._needs_compaction or (
+                    self._log_lines + len(self._pending_ops) > USERS_COMPACT_FACTOR * max(len(self.users), 1)
+                ):
+                    self._write_snapshot()
+                else:
+                    with open(self.users_file, 'ab') as f:
+                        f.write(b"".join(self._dumps_line(op) for op in self._pending_ops))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._log_lines += len(self._pending_ops)
+                self._pending_ops = []
+                self._needs_compaction = False
+            except Exception as e:
+                print(f"Warning: Could not save users to {self.users_file}: {e}")
+
+    def _write_snapshot(self) -> None:
+        """Atomically replace the users log with one upsert line per user."""
+        with self._save_lock:
+            users = list(self.users.values())
+            data = b"".join(self._dumps_line({"op": "upsert", "user": user}) for user in users)
+        tmp_path = self.users_file + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._backup_users_file()
+        os.replace(tmp_path, self.users_file)
+        self._log_lines = len(users)
+
+    @staticmethod
+    def _dumps_line(op: dict) -> bytes:
+        """Serialize one log op as a newline-terminated JSON line."""
+        if orjson is not None:
+            return orjson.dumps(op, option=orjson.OPT_APPEND_NEWLINE)
+        return (json.dumps(op) + "\n").encode("utf-8")
+
+    def _backup_users_file(self) -> None:
+        """Copy the current users file into the backup dir and prune old copies."""
+        if not os.path.exists(self.users_file):
+            return
         try:
-            with open(self.users_file, 'w') as f:
-                json.dump(self.users, f, indent=2)
-        except Exception as e:
-            print(f"Warning: Could not save users to {self.users_file}: {e}")
+            backup_dir = os.path.join(os.path.dirname(self.users_file), USERS_BACKUP_DIR)
+            os.makedirs(backup_dir, exist_ok=True)
+            stem, ext = os.path.splitext(os.path.basename(self.users_file))
+            timestamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1e6) % 1_000_000:06d}"
+            shutil.copy2(self.users_file, os.path.join(backup_dir, f"{stem}.{timestamp}{ext}"))
+
+            # Timestamped names sort chronologically
+            backups = sorted(
+                name for name in os.listdir(backup_dir)
+                if name.startswith(f"{stem}.") and name.endswith(ext)
+            )
+            for stale in backups[:-USERS_MAX_BACKUPS]:
+                os.remove(os.path.join(backup_dir, stale))
+        except OSError as e:
+            print(f"Warning: Could not back up {self.users_file}: {e}")
+
+    def _flush_now(self) -> None:
+        """Cancel any pending debounced write and flush immediately."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._flush()
 
     def load_from_file(self) -> None:
-        """Load users from JSON file if it exists."""
-        if os.path.exists(self.users_file):
-            try:
-                with open(self.users_file, 'r') as f:
-                    self.users = json.load(f)
-                    print(f"✓ Loaded {len(self.users)} user(s) from {self.users_file}")
-            except Exception as e:
-                print(f"Warning: Could not load users from {self.users_file}: {e}")
+        """Load users by replaying the JSONL log if it exists."""
+        legacy_file = os.path.splitext(self.users_file)[0] + ".json"
+        if not os.path.exists(self.users_file):
+            if legacy_file != self.users_file and os.path.exists(legacy_file):
+                self._migrate_legacy_file(legacy_file)
+            return
+        try:
+            users: Dict[str, dict] = {}
+            line_count = 0
+            with open(self.users_file, 'rb') as f:
+                for line_num, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    line_count += 1
+                    try:
+                        op = orjson.loads(line) if orjson is not None else json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave a torn final line
+                        print(f"Warning: Skipping malformed line {line_num} in {self.users_file}")
+                        continue
+                    if op.get("op") == "upsert":
+                        users[op["user"]["user_id"]] = op["user"]
+                    elif op.get("op") == "delete":
+                        users.pop(op["id"], None)
+            self.users = users
+            self._log_lines = line_count
+            print(f"✓ Loaded {len(self.users)} user(s) from {self.users_file}")
+
+            # Drop superseded ops on startup
+            if line_count > len(self.users):
+                self._write_snapshot()
+        except Exception as e:
+            print(f"Warning: Could not load users from {self.users_file}: {e}")
+
+    def _migrate_legacy_file(self, legacy_file: str) -> None:
+        """Import users from a pre-JSONL users.json file into a fresh log."""
+        try:
+            with open(legacy_file, 'rb') as f:
+                data = f.read()
+            self.users = orjson.loads(data) if orjson is not None else json.loads(data)
+            self._write_snapshot()
+            print(f"✓ Migrated {len(self.users)} user(s) from {legacy_file} to {self.users_file}")
+        except Exception as e:
+            print(f"Warning: Could not migrate users from {legacy_file}: {e}")
 
     def clear_all(self) -> None:
         """Clear all users and save to file."""
-        self.users = {}
-        self.save_to_file()
+        with self._save_lock:
+            self.users = {}
+            self._pending_ops = []
+            self.save_to_file()
 
 
 class SimpleRAG:
     """Simple RAG system: load multiple PDFs, store user context, generate personalized responses via Groq."""
 
-    def __init__(self, model: str = None, users_file: str = "users.json"):
+    def __init__(self, model: str = None, users_file: str = "users.jsonl", backend: str = "auto"):
         """Initialize RAG with model and user context DB with persistence.
 
         The model will be taken from the `model` argument if provided,
         otherwise from the `GROQ_MODEL` environment variable, and finally
         falls back to `openai/gpt-oss-20b` per project configuration.
+
+        `backend` selects the PDF text extractor: "pdfium" (pypdfium2),
+        "pypdf2", or "auto" to use pypdfium2 when it is installed.
         """
         # Prefer explicit argument -> env var -> fallback default
         # Default to `openai/gpt-oss-20b`.
         self.model = model or os.getenv("GROQ_MODEL") or "openai/gpt-oss-20b"
         self.documents: List[Dict[str, str]] = []  # Store PDFs with metadata: {name, text, pages, char_count}
-        self.conversation_history: List[dict] = []  # For multi-turn conversations
-        self.client = None
+        # For multi-turn conversations: user_id -> that user's turns, so one user's
+        # profile and questions are never replayed into another user's prompt
+        self.conversation_history: Dict[Optional[str], List[dict]] = {}
+        self.max_history_turns: int = MAX_HISTORY_TURNS
+        # Joined text of all documents, rebuilt lazily after the document set changes
+        self._context_cache: Optional[str] = None
+        self._system_message_cache: Optional[str] = None
+        # Retrieval index as parallel arrays: L2-normalized float32 embeddings
+        # (C-contiguous, one row per chunk), chunk texts, and owning document index
+        self.chunk_matrix = None
+        self.chunk_text: List[str] = []
+        self.chunk_doc_idx = None
+        self._embedder = None
+        self._embedder_failed = False  # Set once loading fails so it is not retried per call
+        # Guards documents and the retrieval index so PDFs can be loaded from worker threads
+        self._lock = threading.RLock()
         self.user_db = UserContextDB(users_file=users_file)  # Initialize with persistence
 
-        api_key = os.getenv("GROQ_API_KEY")
-        if Groq is None:
-            print("Warning: 'groq' package not installed. Install it to enable Groq generation.")
-        elif not api_key:
-            print("Warning: GROQ_API_KEY environment variable not set. Set it to enable generation.")
-        else:
-            try:
-                self.client = Groq(api_key=api_key)
-            except Exception as e:
-                print(f"Error initializing Groq client: {e}")
-                self.client = None
+        if backend not in ("auto", "pdfium", "pypdf2"):
+            raise ValueError(f"Unknown PDF backend: {backend}")
+        if backend == "pdfium" and pdfium is None:
+            print("Warning: 'pypdfium2' package not installed. Falling back to PyPDF2.")
+        self.pdf_backend = "pdfium" if backend != "pypdf2" and pdfium is not None else "pypdf2"
+
+    @property
+    def client(self):
+        """Groq client shared by all SimpleRAG instances, created on first use (None if unavailable)."""
+        return _get_groq_client()
 
     def load_pdf(self, pdf_path: str) -> str:
         """
@@ -154,47 +439,205 @@ class SimpleRAG:
             Extracted text from PDF
         """
         try:
-            text = ""
-            pdf_name = os.path.basename(pdf_path)
-            page_count = 0
-            
             with open(pdf_path, "rb") as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                page_count = len(pdf_reader.pages)
-                for page_num, page in enumerate(pdf_reader.pages, 1):
-                    page_text = page.extract_text() or ""
-                    text += f"\n--- {pdf_name} Page {page_num} ---\n{page_text}"
+                data = pdf_file.read()
+        except Exception as e:
+            print(f"Error loading PDF: {e}")
+            return ""
+        return self.load_pdf_bytes(data, os.path.basename(pdf_path)) or ""
+
+    def load_pdf_bytes(self, data: bytes, pdf_name: str) -> Optional[str]:
+        """
+        Load and extract text from in-memory PDF bytes (e.g. an upload).
+
+        Args:
+            data: Raw PDF bytes
+            pdf_name: Display name for the document
+
+        Returns:
+            Extracted text from PDF, or None if the PDF could not be loaded
+        """
+        try:
+            sha256 = hashlib.sha256(data).hexdigest()
+            # Different backends extract slightly different text, so key by both
+            digest = f"v{PDF_CACHE_VERSION}-{self.pdf_backend}-{sha256}"
+
+            # Only raw page texts are cached; headers use the current name on every load
+            cached = self._read_pdf_cache(digest)
+            if cached is not None:
+                page_texts = cached["page_texts"]
+            else:
+                if self.pdf_backend == "pdfium":
+                    page_texts = self._extract_with_pdfium(data)
+                else:
+                    page_texts = self._extract_pages(data)
+                self._write_pdf_cache(digest, {"page_texts": page_texts})
+
+            page_count = len(page_texts)
+            # Blank/image-only pages still count as pages but add no header noise
+            empty_pages = [
+                page_num for page_num, page_text in enumerate(page_texts, 1)
+                if not page_text.strip()
+            ]
+            text = "".join(
+                f"\n--- {pdf_name} Page {page_num} ---\n{page_text}"
+                for page_num, page_text in enumerate(page_texts, 1)
+                if page_text.strip()
+            )
 
             # Add to documents list (supports multiple PDFs)
             doc_entry = {
                 "name": pdf_name,
                 "text": text,
                 "pages": page_count,
-                "char_count": len(text)
+                "char_count": len(text),
+                "empty_pages": empty_pages,
+                "sha256": sha256,
             }
-            self.documents.append(doc_entry)
+            # Embed outside the lock so concurrent loads only serialize the cheap append
+            embedded = self._embed_document(doc_entry)
+            with self._lock:
+                self.documents.append(doc_entry)
+                self._invalidate_context()
+                if embedded is not None:
+                    self._index_chunks(*embedded, len(self.documents) - 1)
             print(f"✓ PDF loaded: {pdf_name} ({page_count} pages, {len(text)} characters)")
             return text
         except Exception as e:
             print(f"Error loading PDF: {e}")
-            return ""
+            return None
+
+    def _extract_pages(self, data: bytes) -> List[str]:
+        """
+        Extract text from every page of a PDF using a thread pool.
+
+        Each worker thread opens its own PdfReader over the bytes, since PyPDF2
+        resolves objects lazily from a shared stream and is not thread-safe.
+
+        Args:
+            data: Raw PDF bytes
+
+        Returns:
+            Page texts in page order
+        """
+        page_count = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+        local = threading.local()
+
+        def _extract(index: int):
+            reader = getattr(local, "reader", None)
+            if reader is None:
+                reader = local.reader = PyPDF2.PdfReader(io.BytesIO(data))
+            return index, reader.pages[index].extract_text() or ""
+
+        parts = []
+        with ThreadPoolExecutor(max_workers=max(1, min(PDF_MAX_WORKERS, page_count))) as executor:
+            if page_count <= PDF_STREAMING_PAGE_THRESHOLD:
+                parts.extend(executor.map(_extract, range(page_count)))
+            else:
+                for start in range(0, page_count, PDF_PAGE_BATCH_SIZE):
+                    batch = range(start, min(start + PDF_PAGE_BATCH_SIZE, page_count))
+                    parts.extend(executor.map(_extract, batch))
+
+        parts.sort(key=lambda part: part[0])
+        return [page_text for _, page_text in parts]
+
+    def _extract_with_pdfium(self, data: bytes) -> List[str]:
+        """
+        Extract text from every page of a PDF using pypdfium2.
+
+        PDFium is not thread-safe, so pages are decoded serially and the whole
+        extraction holds _PDFIUM_LOCK in case several PDFs load concurrently.
+        The C implementation is still far faster than the threaded PyPDF2 path.
+
+        Args:
+            data: Raw PDF bytes
+
+        Returns:
+            Page texts in page order
+        """
+        page_texts = []
+        with _PDFIUM_LOCK:
+            doc = pdfium.PdfDocument(data)
+            try:
+                for page in doc:
+                    textpage = page.get_textpage()
+                    try:
+                        page_texts.append(textpage.get_text_range() or "")
+                    finally:
+                        textpage.close()
+                        page.close()
+            finally:
+                doc.close()
+        return page_texts
+
+    def _read_pdf_cache(self, digest: str) -> Optional[dict]:
+        """
+        Look up previously extracted text for a PDF.
+
+        Args:
+            digest: Cache key (format version, backend name and SHA-256 of the PDF bytes)
+
+        Returns:
+            Cached entry ({"page_texts": [...]}) or None on a miss
+        """
+        cache_path = os.path.join(PDF_CACHE_DIR, f"{digest}.json")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Refresh mtime so LRU eviction keeps recently used entries
+            os.utime(cache_path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_pdf_cache(self, digest: str, entry: dict) -> None:
+        """Atomically store extracted per-page PDF text and evict old cache entries."""
+        try:
+            os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, os.path.join(PDF_CACHE_DIR, f"{digest}.json"))
+            self._evict_pdf_cache()
+        except OSError as e:
+            print(f"Warning: Could not write PDF cache: {e}")
+
+    def _evict_pdf_cache(self) -> None:
+        """Keep only the PDF_CACHE_MAX_ENTRIES most recently used cache files."""
+        entries = [
+            os.path.join(PDF_CACHE_DIR, name)
+            for name in os.listdir(PDF_CACHE_DIR)
+            if name.endswith(".json")
+        ]
+        if len(entries) <= PDF_CACHE_MAX_ENTRIES:
+            return
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[PDF_CACHE_MAX_ENTRIES:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
 
-    def generate_response(self, query: str, user_id: str = None) -> str:
+    def generate_response(
+        self, query: str, user_id: str = None, stream: bool = False
+    ) -> Union[str, Iterator[str]]:
         """
         Generate a personalized response based on query, multiple PDF contents, and user context using Groq.
 
         Args:
             query: User query
             user_id: Optional user ID for personalization
+            stream: If True, return an iterator of text pieces as Groq produces them
 
         Returns:
             Generated response from Groq or a guidance message if client not configured
+            (an iterator of strings when `stream` is True)
         """
         if not self.documents:
-            return "No PDF loaded. Please upload a PDF first."
+            return self._as_reply("No PDF loaded. Please upload a PDF first.", stream)
 
-        # Prepare combined document context from all loaded PDFs
-        context = "\n\n".join([doc["text"] for doc in self.documents])
+        # Prefer the top-k retrieved chunks; fall back to all loaded PDFs
+        retrieved_context = self._retrieve_context(query)
 
         # Retrieve user context if user_id is provided
         user_context_str = ""
@@ -205,36 +648,39 @@ class SimpleRAG:
             else:
                 user_context_str = f"User ID: {user_id} (no profile data available)"
 
-        # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": query})
-
-        # Build system prompt with user context awareness
-        system_prompt = (
-            "You are a helpful, personalized assistant. "
-            "Answer questions based on the provided document context and user context. "
-            "Tailor your response to the user's preferences and history when relevant. "
-            "If the answer is not in the document, say 'The information is not available in the provided document.'"
-        )
+        # Immutable prefix: system prompt (+ full document text when not retrieving).
+        # It stays byte-identical across turns so the provider's prefix cache applies.
+        system_message = self._build_system_message(include_documents=retrieved_context is None)
 
-        # Build user message with document + user context
-        user_message = f"Document context:\n{context}"
+        # Per-turn content goes in the user message after the stable prefix
+        message_parts = []
+        if retrieved_context is not None:
+            message_parts.append(f"Document context:\n{retrieved_context}")
         if user_context_str:
-            user_message += f"\n\nUser Context:\n{user_context_str}"
-        user_message += f"\n\nQuestion: {query}"
+            message_parts.append(f"User Context:\n{user_context_str}")
+        question = f"Question: {query}"
+        message_parts.append(question)
+        user_message = "\n\n".join(message_parts)
 
-        # Build messages for Groq API
+        # Earlier turns are replayed unchanged so the common prefix only grows;
+        # they hold just the question and answer, not the per-turn context
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": system_message},
+            *self.conversation_history.get(user_id, []),
             {"role": "user", "content": user_message},
         ]
 
         if not self.client:
-            return (
+            return self._as_reply(
                 "Groq client not configured.\n"
                 "Set the GROQ_API_KEY environment variable (or add it to your .env) and restart the app.\n"
-                "Example (PowerShell): $env:GROQ_API_KEY = 'your_key_here'"
+                "Example (PowerShell): $env:GROQ_API_KEY = 'your_key_here'",
+                stream,
             )
 
+        if stream:
+            return self._stream_response(messages, user_id, question)
+
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -248,11 +694,179 @@ class SimpleRAG:
             except Exception:
                 answer = getattr(response, "text", None) or str(response)
 
-            self.conversation_history.append({"role": "assistant", "content": answer})
+            self._record_turn(user_id, question, answer)
             return answer
         except Exception as e:
             return f"Error generating response: {str(e)}"
 
+    def _stream_response(self, messages: List[dict], user_id: Optional[str], question: str) -> Iterator[str]:
+        """Yield response text from a streaming Groq completion, then record the turn."""
+        parts = []
+        try:
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True,
+            )
+            for chunk in completion:
+                if not chunk.choices:
+                    continue
+                piece = chunk.choices[0].delta.content or ""
+                if piece:
+                    parts.append(piece)
+                    yield piece
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+            return
+
+        self._record_turn(user_id, question, "".join(parts))
+
+    def _as_reply(self, text: str, stream: bool) -> Union[str, Iterator[str]]:
+        """Return a fixed reply in the shape the caller asked for."""
+        return iter([text]) if stream else text
+
+    def _record_turn(self, user_id: Optional[str], question: str, answer: str) -> None:
+        """Append a completed turn (question and answer only) to the user's conversation history."""
+        history = self.conversation_history.get(user_id, [])
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+        # Keep only the most recent turns (one user + one assistant message each)
+        self.conversation_history[user_id] = history[-2 * self.max_history_turns:]
+
+    def _build_system_message(self, include_documents: bool) -> str:
+        """
+        Build the system message that forms the cacheable prompt prefix.
+
+        Args:
+            include_documents: Whether to embed the full text of all loaded PDFs
+
+        Returns:
+            System message, identical across calls until the documents change
+        """
+        if not include_documents:
+            return SYSTEM_PROMPT
+        if self._system_message_cache is None:
+            if self._context_cache is None:
+                self._context_cache = "\n\n".join(doc["text"] for doc in self.documents)
+            self._system_message_cache = f"{SYSTEM_PROMPT}\n\nDocument context:\n{self._context_cache.rstrip()}"
+        return self._system_message_cache
+
+    def _invalidate_context(self) -> None:
+        """Drop the cached joined document context after the document set changes."""
+        self._context_cache = None
+        self._system_message_cache = None
+
+    def _get_embedder(self):
+        """Lazily load the sentence-transformers model, or return None if unavailable."""
+        if self._embedder is None and not self._embedder_failed and np is not None:
+            with self._lock:
+                if self._embedder is None and not self._embedder_failed:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except Exception:
+                        # Optional dependency; fall back to sending the full document text
+                        self._embedder_failed = True
+                        return None
+                    try:
+                        self._embedder = SentenceTransformer(EMBEDDING_MODEL)
+                    except Exception as e:
+                        print(f"Warning: Could not load embedding model {EMBEDDING_MODEL}: {e}")
+                        self._embedder_failed = True
+        return self._embedder
+
+    def _split_into_chunks(self, text: str) -> List[str]:
+        """Split text into fixed-size chunks of CHUNK_SIZE chars overlapping by CHUNK_OVERLAP."""
+        step = CHUNK_SIZE - CHUNK_OVERLAP
+        return [
+            text[start:start + CHUNK_SIZE]
+            for start in range(0, max(len(text) - CHUNK_OVERLAP, 1), step)
+            if text[start:start + CHUNK_SIZE].strip()
+        ]
+
+    def _embed_document(self, doc_entry: dict):
+        """
+        Chunk and embed a document for retrieval.
+
+        Args:
+            doc_entry: Loaded document entry
+
+        Returns:
+            Tuple of (chunk texts, L2-normalized float32 vectors), or None if unavailable
+        """
+        embedder = self._get_embedder()
+        if embedder is None:
+            return None
+
+        chunk_texts = self._split_into_chunks(doc_entry["text"])
+        if not chunk_texts:
+            return None
+        try:
+            vectors = np.asarray(embedder.encode(chunk_texts), dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Could not embed {doc_entry['name']}: {e}")
+            return None
+
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return chunk_texts, vectors
+
+    def _index_chunks(self, chunk_texts: List[str], vectors, doc_index: int) -> None:
+        """Append a document's embedded chunks to the retrieval index."""
+        doc_idx = np.full(len(chunk_texts), doc_index, dtype=np.int32)
+
+        self.chunk_text.extend(chunk_texts)
+        if self.chunk_matrix is None:
+            self.chunk_matrix = np.ascontiguousarray(vectors)
+            self.chunk_doc_idx = doc_idx
+        else:
+            self.chunk_matrix = np.vstack([self.chunk_matrix, vectors])
+            self.chunk_doc_idx = np.concatenate([self.chunk_doc_idx, doc_idx])
+
+    def _remove_chunks(self, doc_index: int) -> None:
+        """Drop a document's chunks from the retrieval index with a single mask."""
+        keep = self.chunk_doc_idx != doc_index
+        if not keep.any():
+            self.chunk_matrix = None
+            self.chunk_text = []
+            self.chunk_doc_idx = None
+            return
+        self.chunk_matrix = np.ascontiguousarray(self.chunk_matrix[keep])
+        self.chunk_text = [text for text, kept in zip(self.chunk_text, keep) if kept]
+        doc_idx = self.chunk_doc_idx[keep]
+        # Later documents shift down by one after the removal
+        doc_idx[doc_idx > doc_index] -= 1
+        self.chunk_doc_idx = doc_idx
+
+    def _retrieve_context(self, query: str) -> Optional[str]:
+        """
+        Select the document chunks most relevant to the query.
+
+        Args:
+            query: User query
+
+        Returns:
+            Joined top-k chunks, or None if retrieval is unavailable
+        """
+        embedder = self._get_embedder()
+        if embedder is None or self.chunk_matrix is None:
+            return None
+
+        try:
+            q = np.asarray(embedder.encode([query]), dtype=np.float32)[0]
+        except Exception as e:
+            print(f"Warning: Could not embed query: {e}")
+            return None
+
+        # Rows are pre-normalized, so cosine similarity is a single matrix-vector product
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        scores = self.chunk_matrix @ q
+        k = min(RETRIEVAL_TOP_K, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Keep selected chunks in document order so the context reads naturally
+        top.sort()
+        return "\n\n".join(self.chunk_text[i] for i in top)
+
     def _format_user_context(self, user_profile: dict) -> str:
         """
         Format user context for inclusion in the LLM prompt.
@@ -263,15 +877,12 @@ class SimpleRAG:
         Returns:
             Formatted user context string
         """
-        lines = [f"Name: {user_profile.get('name', 'Unknown')}"]
-
-        if user_profile.get("preferences"):
-            lines.append(f"Preferences: {', '.join(user_profile['preferences'])}")
-
-        if user_profile.get("purchase_history"):
-            lines.append(f"Recent interactions: {', '.join(user_profile['purchase_history'][-3:])}")
-
-        return "\n".join(lines)
+        # The cache key is the profile content, so edits never return stale text
+        return _format_profile(
+            user_profile.get("name", "Unknown"),
+            tuple(user_profile.get("preferences") or ()),
+            tuple((user_profile.get("purchase_history") or [])[-3:]),
+        )
 
     def create_user(
         self,
@@ -297,18 +908,27 @@ class SimpleRAG:
 
     def remove_document(self, pdf_name: str) -> bool:
         """Remove a specific document by name."""
-        for i, doc in enumerate(self.documents):
-            if doc["name"] == pdf_name:
-                self.documents.pop(i)
-                print(f"✓ Removed: {pdf_name}")
-                return True
+        with self._lock:
+            for i, doc in enumerate(self.documents):
+                if doc["name"] == pdf_name:
+                    self.documents.pop(i)
+                    self._invalidate_context()
+                    if self.chunk_matrix is not None:
+                        self._remove_chunks(i)
+                    print(f"✓ Removed: {pdf_name}")
+                    return True
         print(f"✗ Document not found: {pdf_name}")
         return False
 
     def clear_documents(self):
         """Clear all loaded documents."""
-        self.documents = []
-        self.conversation_history = []
+        with self._lock:
+            self.documents = []
+            self._invalidate_context()
+            self.chunk_matrix = None
+            self.chunk_text = []
+            self.chunk_doc_idx = None
+            self.conversation_history = {}
         print("All documents cleared.")
 
 
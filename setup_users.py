@@ -1,5 +1,5 @@
 """
-Setup script: Create 2 default users and save to users.json
+Setup script: Create 2 default users and save to users.jsonl
 Run this once to initialize the user database with sample data.
 """
 
@@ -56,7 +56,7 @@ def setup_default_users():
         print(f"   Preferences: {', '.join(user['preferences'])}")
         print(f"   History: {', '.join(user['purchase_history'][:3])}")
 
-    print("\n✓ Users saved to users.json")
+    print("\n✓ Users saved to users.jsonl")
     print("You can now run the Streamlit app or CLI demo and these users will be available!")
 
 
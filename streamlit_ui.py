@@ -5,6 +5,8 @@ Upload PDF, select user profile, ask questions, get personalized Groq-powered re
 
 import streamlit as st
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rag_groq import SimpleRAG
 from dotenv import load_dotenv
 
@@ -24,10 +26,10 @@ if not os.getenv("GROQ_API_KEY"):
 if "rag" not in st.session_state:
     # Do not hard-code a decommissioned model; let SimpleRAG pick from env or fallback.
     # Use the previous requested model explicitly across the app.
-    st.session_state.rag = SimpleRAG(model="openai/gpt-oss-20b", users_file="users.json")
+    st.session_state.rag = SimpleRAG(model="openai/gpt-oss-20b", users_file="users.jsonl")
     users_count = len(st.session_state.rag.list_users())
     if users_count > 0:
-        print(f"✓ Loaded {users_count} users from users.json")
+        print(f"✓ Loaded {users_count} users from users.jsonl")
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -35,6 +37,17 @@ if "messages" not in st.session_state:
 if "current_user_id" not in st.session_state:
     st.session_state.current_user_id = None
 
+# SHA-256 of uploaded PDFs already loaded into the RAG, so reruns skip them
+if "loaded_hashes" not in st.session_state:
+    st.session_state.loaded_hashes = set()
+
+# PDFs are parsed on a background pool; pending loads survive reruns as hash -> (name, future)
+if "pdf_pool" not in st.session_state:
+    st.session_state.pdf_pool = ThreadPoolExecutor(max_workers=4)
+
+if "pdf_futures" not in st.session_state:
+    st.session_state.pdf_futures = {}
+
 st.title("📄 Groq + PDF RAG with User Context")
 st.markdown("Upload a PDF, select a user profile, and get personalized responses based on user context.")
 
@@ -52,20 +65,47 @@ with st.sidebar:
         # Multiple file uploader
         uploaded_files = st.file_uploader("Choose PDF file(s)", type="pdf", accept_multiple_files=True)
 
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-                # Save uploaded file temporarily
-                temp_path = f"temp_{uploaded_file.name}"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+        # Content hashes of documents already in the RAG (kept correct by 🗑️ and Clear All)
+        doc_hashes = {doc.get("sha256") for doc in st.session_state.rag.list_documents()}
+        current_hashes = set()
+        for uploaded_file in uploaded_files or []:
+            data = uploaded_file.getvalue()
+            file_hash = hashlib.sha256(data).hexdigest()
+            current_hashes.add(file_hash)
+            if file_hash in doc_hashes:
+                # Same bytes already loaded (e.g. re-uploaded after leaving the uploader)
+                st.session_state.loaded_hashes.add(file_hash)
+                continue
+            if file_hash in st.session_state.loaded_hashes or file_hash in st.session_state.pdf_futures:
+                # Handled on an earlier rerun; a document removed with 🗑️ stays removed
+                continue
+
+            # Parse PDF straight from memory on the background pool
+            future = st.session_state.pdf_pool.submit(
+                st.session_state.rag.load_pdf_bytes, data, uploaded_file.name
+            )
+            st.session_state.pdf_futures[file_hash] = (uploaded_file.name, future)
+
+        pending = st.session_state.pdf_futures
+        if pending:
+            progress = st.progress(0.0, text=f"Loading {len(pending)} PDF(s)...")
+            futures = {future: name for name, future in pending.values()}
+            for done, future in enumerate(as_completed(futures), 1):
+                progress.progress(done / len(futures), text=f"Loaded {futures[future]} ({done}/{len(futures)})")
+            progress.empty()
 
-                # Load PDF
-                with st.spinner(f"Loading {uploaded_file.name}..."):
-                    text = st.session_state.rag.load_pdf(temp_path)
-                    st.success(f"✓ {uploaded_file.name} loaded ({len(text)} characters)")
+            for file_hash, (name, future) in pending.items():
+                text = future.result()
+                if text is not None:
+                    st.session_state.loaded_hashes.add(file_hash)
+                    st.success(f"✓ {name} loaded ({len(text)} characters)")
+                else:
+                    st.error(f"❌ Could not load {name}")
+            pending.clear()
 
-                # Clean up temp file
-                os.remove(temp_path)
+        # Forget files removed from the uploader; re-uploading one that was deleted
+        # with 🗑️ loads it again, while one still loaded is matched by doc_hashes
+        st.session_state.loaded_hashes &= current_hashes
         
         # Show loaded documents
         st.write("---")
@@ -107,13 +147,13 @@ with st.sidebar:
     with tab2:
         st.subheader("User Profiles")
 
-        # Section 1: Existing Users (Pre-loaded from users.json)
+        # Section 1: Existing Users (Pre-loaded from users.jsonl)
         st.write("**📋 Existing Users**")
         users = st.session_state.rag.list_users()
 
         if users:
             # Display user count badge
-            st.info(f"✓ {len(users)} user(s) loaded from users.json")
+            st.info(f"✓ {len(users)} user(s) loaded from users.jsonl")
 
             # User selection dropdown
             user_names = {user["user_id"]: f"👤 {user['name']} ({user['user_id']})" for user in users}
@@ -168,7 +208,7 @@ with st.sidebar:
                     st.session_state.rag.create_user(
                         new_user_id, new_user_name, prefs_list, history_list
                     )
-                    st.success(f"✓ User '{new_user_id}' created and saved to users.json!")
+                    st.success(f"✓ User '{new_user_id}' created and saved to users.jsonl!")
                     st.session_state.current_user_id = new_user_id
                     st.rerun()
                 else:
@@ -206,11 +246,11 @@ if prompt := st.chat_input("Ask a question about the PDF..."):
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate personalized response
+        # Generate personalized response, rendering tokens as they arrive
         with st.chat_message("assistant"):
-            with st.spinner("Generating personalized response..."):
-                response = st.session_state.rag.generate_response(
-                    prompt, user_id=st.session_state.current_user_id
+            response = st.write_stream(
+                st.session_state.rag.generate_response(
+                    prompt, user_id=st.session_state.current_user_id, stream=True
                 )
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+            )
+            st.session_state.messages.append({"role": "assistant", "content": response})